@@ -0,0 +1,37 @@
+# _assemble.pyx
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+C version of app.assemble_row. Built in place at image build time:
+
+    cythonize -i _assemble.pyx
+
+app.py uses it when the extension imports and falls back to Python otherwise.
+"""
+from cpython.dict cimport PyDict_GetItem
+from cpython.float cimport PyFloat_AsDouble
+from cpython.object cimport PyObject
+
+
+cpdef list assemble(dict payload, tuple keys, double[::1] out):
+    """
+    Write payload values into out in feature order, trying each feature's
+    keys (internal name first, then aliases). Missing features are 0.0.
+    Return the internal names of the missing features.
+    """
+    cdef Py_ssize_t i, j
+    cdef tuple feat_keys
+    cdef PyObject* v
+    cdef list missing = []
+
+    for i in range(len(keys)):
+        feat_keys = <tuple>keys[i]
+        out[i] = 0.0
+        for j in range(len(feat_keys)):
+            v = PyDict_GetItem(payload, feat_keys[j])
+            # null is treated as missing
+            if v is not NULL and <object>v is not None:
+                out[i] = PyFloat_AsDouble(<object>v)
+                break
+        else:
+            missing.append(feat_keys[0])
+    return missing
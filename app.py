@@ -1,34 +1,66 @@
 # app.py
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import asyncio
+import fcntl
+import functools
+import hashlib
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, ValidationError
 import joblib
+import orjson
 import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
 import numpy as np
-from typing import Tuple, Optional
+from typing import Annotated, Dict, List, Optional, Tuple
+
+try:
+    import treelite
+    import treelite_runtime
+except ImportError:
+    treelite = treelite_runtime = None
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+try:
+    # built at image build time with `cythonize -i _assemble.pyx`
+    from _assemble import assemble as assemble_c
+except ImportError:
+    assemble_c = None
 
-app = FastAPI(title="PdM RUL API (XGBoost)")
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson instead of the stdlib json module."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+app = FastAPI(title="PdM RUL API (XGBoost)", default_response_class=ORJSONResponse)
 
 # -------------------------
 # Helper: locate model files
 # -------------------------
+ARTIFACT_DIRS = (Path("."), Path("models"))
+
+
+@functools.cache
 def find_artifact_paths() -> Tuple[str, str, str]:
     """
-    Try common locations for model artifacts.
+    Try common locations for model artifacts (repo root, then models/).
     Return (model_path, scaler_path, features_path).
     Raises FileNotFoundError if none found.
     """
-    candidates = [
-        # repo root
-        ("xgboost_model.pkl", "scaler.pkl", "features.txt"),
-        # models/ subfolder
-        (os.path.join("models", "xgboost_model.pkl"),
-         os.path.join("models", "scaler.pkl"),
-         os.path.join("models", "features.txt")),
-    ]
-
-    for model_p, scaler_p, feat_p in candidates:
-        if os.path.exists(model_p) and os.path.exists(scaler_p) and os.path.exists(feat_p):
-            return model_p, scaler_p, feat_p
+    for base in ARTIFACT_DIRS:
+        paths = (base / "xgboost_model.pkl", base / "scaler.pkl", base / "features.txt")
+        if all(p.exists() for p in paths):
+            return tuple(str(p) for p in paths)
 
     # not found
     raise FileNotFoundError(
@@ -36,48 +68,13 @@ def find_artifact_paths() -> Tuple[str, str, str]:
         "'xgboost_model.pkl','scaler.pkl','features.txt' or in 'models/' subfolder."
     )
 
-# -------------------------
-# Startup diagnostics
-# -------------------------
-print("=== STARTUP: PdM RUL API ===")
-print("cwd:", os.getcwd())
-print("files in cwd:", os.listdir())
-# if there's a models folder, print it too
-if os.path.exists("models"):
-    try:
-        print("files in ./models:", os.listdir("models"))
-    except Exception as e:
-        print("could not list ./models:", str(e))
-
-# -------------------------
-# Load artifacts (safe)
-# -------------------------
-try:
-    MODEL_PATH, SCALER_PATH, FEATURES_PATH = find_artifact_paths()
-    print(f"Using MODEL_PATH={MODEL_PATH}, SCALER_PATH={SCALER_PATH}, FEATURES_PATH={FEATURES_PATH}")
-except FileNotFoundError as e:
-    # re-raise as RuntimeError so container shows it in logs and app continues to start
-    print("ERROR:", str(e))
-    # we still create the app but will return 500 on predict until fixed
-    MODEL_PATH = SCALER_PATH = FEATURES_PATH = None
-
-model = None
-scaler = None
-internal_features = []
 
-if MODEL_PATH and SCALER_PATH and FEATURES_PATH:
-    try:
-        model = joblib.load(MODEL_PATH)
-        scaler = joblib.load(SCALER_PATH)
-        with open(FEATURES_PATH, "r") as f:
-            internal_features = [line.strip() for line in f.readlines() if line.strip()]
-        print("Model and scaler loaded successfully. Number of features:", len(internal_features))
-    except Exception as e:
-        # If loading fails, print error. We'll return 500 on predict.
-        print("Failed to load model/scaler/features:", str(e))
-        model = None
-        scaler = None
-        internal_features = []
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
 # -------------------------
 # Human-readable mapping
@@ -109,16 +106,584 @@ readable_to_internal = {
     "LPT_coolant_bleed": "s21",
 }
 
-# Inverse map (internal -> list of readable names)
-internal_to_readables = {}
+# Inverse map (internal -> tuple of readable names), frozen once at import
+_aliases: Dict[str, List[str]] = {}
 for r, i in readable_to_internal.items():
-    internal_to_readables.setdefault(i, []).append(r)
+    _aliases.setdefault(i, []).append(r)
+internal_to_readables: Dict[str, Tuple[str, ...]] = {i: tuple(rs) for i, rs in _aliases.items()}
+del _aliases
+
+# -------------------------
+# Startup diagnostics
+# -------------------------
+# Directory listings are only printed with DEBUG_STARTUP=1.
+DEBUG_STARTUP = os.environ.get("DEBUG_STARTUP") == "1"
+
+
+def print_startup_diagnostics():
+    print("=== STARTUP: PdM RUL API ===")
+    print("cwd:", os.getcwd())
+    print("files in cwd:", os.listdir())
+    # if there's a models folder, print it too
+    if os.path.exists("models"):
+        try:
+            print("files in ./models:", os.listdir("models"))
+        except Exception as e:
+            print("could not list ./models:", str(e))
+
+# -------------------------
+# Load artifacts (safe)
+# -------------------------
+# Artifacts are loaded from the startup hook rather than at import time, so
+# each uvicorn worker process loads them exactly once.
+MODEL_PATH = SCALER_PATH = FEATURES_PATH = None
+model = None
+booster = None
+predictor = None
+ort_session = None
+fil = None
+BACKEND = "xgboost"
+internal_features: Tuple[str, ...] = ()
+
+# Per-feature lookup keys in priority order: (internal_name, alias1, ...).
+# Built once so /predict does not re-derive aliases on every request.
+FEATURE_LOOKUP: Tuple[Tuple[str, ...], ...] = ()
+# Internal names and aliases -> (feature index, is_alias), for a single pass
+# over the payload keys.
+NAME_TO_IDX: Dict[str, Tuple[int, bool]] = {}
+N_FEATS = 0
+
+# Fused scaler: apply (x - mean_) / scale_ directly instead of going through
+# StandardScaler.transform, whose validation/copy dominates for a single row.
+# Only these two read-only arrays are kept; the scaler object is dropped.
+# They stay float64 like sklearn's: scaling in float32 moves rows across
+# split thresholds, while scaling in float64 and casting the result (as
+# XGBoost would anyway) matches scaler.transform + model.predict exactly.
+MEAN: Optional[np.ndarray] = None
+SCALE: Optional[np.ndarray] = None
+
+# Ahead-of-time compiling the trees with treelite skips the Python wrapper
+# and DMatrix construction on every request. If treelite is not installed
+# (or compilation fails) we fall back to booster.inplace_predict.
+# The library sits next to the model, named after a hash of the model file.
+# The Dockerfile builds it with build_treelite.py, since the runtime image has
+# no compiler; elsewhere the first worker compiles it under a file lock and
+# renames it into place, and later workers and restarts reuse it.
+# Targets the treelite 3.x API (Model.export_lib + treelite_runtime), pinned
+# in requirements.txt.
+TREELITE_PARALLEL_COMP = 8
+
+
+def treelite_lib_path(model_path: str) -> str:
+    return os.path.join(
+        os.path.dirname(model_path), f"xgboost_model_{file_sha256(model_path)[:16]}.so"
+    )
+
+
+def compile_treelite(booster, model_path: str):
+    if treelite is None:
+        print("Treelite unavailable, using XGBoost predict: treelite not installed")
+        return None
+    try:
+        lib_path = treelite_lib_path(model_path)
+        if os.path.exists(lib_path):
+            print("Treelite predictor reused:", lib_path)
+            return treelite_runtime.Predictor(lib_path, nthread=1)
+        with open(lib_path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(lib_path):
+                tmp_path = f"{lib_path[:-3]}.{os.getpid()}.tmp.so"
+                tl_model = treelite.Model.from_xgboost(booster)
+                tl_model.export_lib(
+                    toolchain="gcc",
+                    libpath=tmp_path,
+                    params={"parallel_comp": TREELITE_PARALLEL_COMP},
+                    verbose=False,
+                )
+                os.replace(tmp_path, lib_path)
+                print("Treelite predictor compiled:", lib_path)
+            else:
+                print("Treelite predictor reused:", lib_path)
+        return treelite_runtime.Predictor(lib_path, nthread=1)
+    except Exception as e:
+        print("Treelite unavailable, using XGBoost predict:", str(e))
+        return None
+
+
+# Optional ONNX Runtime backend, used when convert_onnx.py has written
+# xgboost_model.onnx next to the pickled model, onnxruntime is installed and
+# no treelite library is available. The fp32 export is not faster than
+# treelite, so it never takes priority over it. The session is checked
+# against the booster on load because converter bugs (a dropped base_score,
+# remapped features) would otherwise go straight into the prediction cache.
+ONNX_INPUT_NAME = "input"
+ONNX_CHECK_ROWS = 32
+# float32 tree sums in a different order differ by ~1e-4 RUL
+ONNX_CHECK_ATOL = 1e-3
+
+
+def onnx_matches_booster(sess, booster) -> bool:
+    x = np.random.default_rng(0).standard_normal(
+        (ONNX_CHECK_ROWS, booster.num_features())
+    ).astype(np.float32)
+    got = sess.run(None, {ONNX_INPUT_NAME: x})[0].reshape(-1)
+    return np.allclose(got, booster.inplace_predict(x), rtol=0, atol=ONNX_CHECK_ATOL)
+
+
+def load_onnx_session(booster, model_path: str):
+    onnx_path = os.path.join(os.path.dirname(model_path), "xgboost_model.onnx")
+    if ort is None or not os.path.exists(onnx_path):
+        return None
+    try:
+        so = ort.SessionOptions()
+        so.intra_op_num_threads = 1
+        sess = ort.InferenceSession(onnx_path, so, providers=["CPUExecutionProvider"])
+        if not onnx_matches_booster(sess, booster):
+            print("ONNX model output differs from the booster, using XGBoost predict:", onnx_path)
+            return None
+        print("ONNX Runtime session loaded:", onnx_path)
+        return sess
+    except Exception as e:
+        print("Failed to load ONNX model, using XGBoost predict:", str(e))
+        return None
+
+
+# Optional GPU tier: with cuML and a CUDA device, large batches go to a
+# GPU-resident Forest Inference model while small ones stay on the CPU backend.
+# cuML is imported lazily since it is heavy and only present on GPU images.
+# The UBJ export is named after the model hash and reused, like the treelite
+# library.
+
+
+def load_fil(booster, model_path: str):
+    try:
+        from cuml import ForestInference
+        from numba import cuda
+
+        if not cuda.is_available():
+            return None
+    except Exception as e:
+        # a broken CUDA install can fail with more than ImportError
+        if not isinstance(e, ImportError):
+            print("cuML unavailable, using CPU only:", str(e))
+        return None
+    try:
+        ubj_path = os.path.join(
+            tempfile.gettempdir(), f"xgboost_model_{file_sha256(model_path)[:16]}.ubj"
+        )
+        if not os.path.exists(ubj_path):
+            tmp_path = f"{ubj_path[:-4]}.{os.getpid()}.tmp.ubj"
+            booster.save_model(tmp_path)
+            os.replace(tmp_path, ubj_path)
+        fil_model = ForestInference.load(ubj_path, model_type="xgboost_ubj", output_class=False)
+        if hasattr(fil_model, "optimize"):
+            fil_model.optimize(batch_size=MAX_BATCH)
+        print("cuML FIL loaded for batches of", GPU_MIN_BATCH, "rows or more")
+        return fil_model
+    except Exception as e:
+        print("Failed to load cuML FIL, using CPU only:", str(e))
+        return None
+
+
+def frozen_float64(a) -> np.ndarray:
+    out = np.ascontiguousarray(a, dtype=np.float64)
+    out.flags.writeable = False
+    return out
+
+
+def load_scaler_arrays(scaler_path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return (mean, scale) as frozen float64 arrays. Prefer scaler.npz (written
+    by convert_scaler.py) next to the pickle, which skips unpickling sklearn.
+    The npz records the sha256 of the scaler.pkl it was exported from and is
+    only used while that still matches; scaler.pkl stays the source of truth.
+    """
+    npz_path = os.path.join(os.path.dirname(scaler_path), "scaler.npz")
+    if os.path.exists(npz_path):
+        with np.load(npz_path) as z:
+            source = str(z["source_sha256"]) if "source_sha256" in z.files else None
+            if source == file_sha256(scaler_path):
+                return frozen_float64(z["mean"]), frozen_float64(z["scale"])
+        print("scaler.npz is stale (does not match scaler.pkl), loading scaler.pkl; re-run convert_scaler.py")
+    # only the frozen mean_/scale_ copies are kept, not the sklearn object
+    scaler = joblib.load(scaler_path)
+    return frozen_float64(scaler.mean_), frozen_float64(scaler.scale_)
+
+
+@app.on_event("startup")
+def load_artifacts():
+    global MODEL_PATH, SCALER_PATH, FEATURES_PATH
+    global model, booster, predictor, ort_session, fil, BACKEND, internal_features
+    global FEATURE_LOOKUP, NAME_TO_IDX, N_FEATS, MEAN, SCALE, BATCH_BUF, BATCH_X, ROW_ASSEMBLY
+
+    if DEBUG_STARTUP:
+        print_startup_diagnostics()
+    try:
+        MODEL_PATH, SCALER_PATH, FEATURES_PATH = find_artifact_paths()
+        print(f"Using MODEL_PATH={MODEL_PATH}, SCALER_PATH={SCALER_PATH}, FEATURES_PATH={FEATURES_PATH}")
+    except FileNotFoundError as e:
+        print("ERROR:", str(e))
+        # we still start the app but will return 500 on predict until fixed
+        return
+
+    try:
+        model = joblib.load(MODEL_PATH)
+        MEAN, SCALE = load_scaler_arrays(SCALER_PATH)
+        with open(FEATURES_PATH, "r") as f:
+            internal_features = tuple(line.strip() for line in f if line.strip())
+        print("Model and scaler loaded successfully. Number of features:", len(internal_features))
+    except Exception as e:
+        # If loading fails, print error. We'll return 500 on predict.
+        print("Failed to load model/scaler/features:", str(e))
+        model = None
+        MEAN = SCALE = None
+        internal_features = ()
+        return
+
+    # Raw Booster for inplace_predict, which skips per-call DMatrix construction.
+    # One thread per worker: parallelism comes from uvicorn --workers, and
+    # letting each worker spawn a full OpenMP pool would oversubscribe.
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    booster.set_param({"nthread": 1})
+    # ONNX is only a fallback for when no treelite library can be built
+    predictor = compile_treelite(booster, MODEL_PATH)
+    if predictor is None:
+        ort_session = load_onnx_session(booster, MODEL_PATH)
+    BACKEND = "treelite" if predictor is not None else "onnx" if ort_session is not None else "xgboost"
+    fil = load_fil(booster, MODEL_PATH)
+
+    FEATURE_LOOKUP = tuple(
+        (f, *internal_to_readables.get(f, ())) for f in internal_features
+    )
+    NAME_TO_IDX = {}
+    for i, keys in enumerate(FEATURE_LOOKUP):
+        for j, k in enumerate(keys):
+            NAME_TO_IDX[k] = (i, j > 0)
+    N_FEATS = len(internal_features)
+    BATCH_BUF = np.empty((MAX_BATCH, N_FEATS), dtype=np.float64)
+    BATCH_X = np.empty((MAX_BATCH, N_FEATS), dtype=np.float32)
+
+    if ROW_ASSEMBLY not in ROW_ASSEMBLIES:
+        print(f"Unknown ROW_ASSEMBLY={ROW_ASSEMBLY!r}, using Python")
+        ROW_ASSEMBLY = "python"
+    elif ROW_ASSEMBLY == "cython" and assemble_c is None:
+        print("ROW_ASSEMBLY=cython but _assemble is not built, using Python")
+        ROW_ASSEMBLY = "python"
+    if ROW_ASSEMBLY == "cython" and not check_assembler_parity():
+        print("Cython row assembly disagrees with assemble_row, using Python")
+        ROW_ASSEMBLY = "python"
+    print("Row assembly:", ROW_ASSEMBLY)
+
+    warm_up()
+
+# -------------------------
+# Micro-batching
+# -------------------------
+# Concurrent /predict calls are queued and flushed together: the batch worker
+# waits at most BATCH_WAIT_S after the first queued row (or until MAX_BATCH
+# rows) and runs one prediction over the stacked matrix. Rows are scaled in
+# float64 in BATCH_BUF, then cast once into the float32 BATCH_X the backends
+# take. Everything runs on the event loop thread, so neither needs locking.
+MAX_BATCH = 64
+BATCH_WAIT_S = 0.002
+# batches at least this large go to the GPU forest when one is loaded
+GPU_MIN_BATCH = 32
+# upper bound on how long a request waits for its batch before returning 500
+PREDICT_TIMEOUT_S = 10.0
+BATCH_BUF: Optional[np.ndarray] = None
+BATCH_X: Optional[np.ndarray] = None
+QUEUE: Optional[asyncio.Queue] = None
+_batch_task: Optional[asyncio.Task] = None
+# the batch currently being predicted, so a dying worker can fail it too
+_inflight: List[Tuple[bytes, asyncio.Future]] = []
+
+
+class NonFiniteInput(ValueError):
+    """A row whose scaled values do not fit in float32."""
+
+
+def predict_batch(x: np.ndarray) -> np.ndarray:
+    """Run the active backend on a scaled (n, N_FEATS) float32 matrix."""
+    if fil is not None and len(x) >= GPU_MIN_BATCH:
+        return np.asarray(fil.predict(x)).reshape(-1)
+    if predictor is not None:
+        # treelite squeezes single-row output to a 0-d array
+        return predictor.predict(treelite_runtime.DMatrix(x)).reshape(-1)
+    if ort_session is not None:
+        return ort_session.run(None, {ONNX_INPUT_NAME: x})[0].reshape(-1)
+    return booster.inplace_predict(x)
+
+
+def warm_up(rounds: int = 5):
+    """
+    Run a few dummy predictions so the first real request does not pay for
+    lazy buffer allocation and cold tree data. Called after nthread is set,
+    so the warmed per-thread state matches what requests use.
+    """
+    dummy = np.zeros((1, N_FEATS), dtype=np.float32)
+    try:
+        for _ in range(rounds):
+            predict_batch(dummy)
+        if fil is not None:
+            predict_batch(np.zeros((GPU_MIN_BATCH, N_FEATS), dtype=np.float32))
+    except Exception as e:
+        # a broken backend will surface as 500s on /predict; just log it here
+        print("Warm-up prediction failed:", str(e))
+
+
+async def _collect_batch() -> List[Tuple[bytes, asyncio.Future]]:
+    loop = asyncio.get_running_loop()
+    items = [await QUEUE.get()]
+    deadline = loop.time() + BATCH_WAIT_S
+    while len(items) < MAX_BATCH:
+        try:
+            items.append(QUEUE.get_nowait())
+            continue
+        except asyncio.QueueEmpty:
+            pass
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            items.append(await asyncio.wait_for(QUEUE.get(), timeout=remaining))
+        except asyncio.TimeoutError:
+            break
+    return items
+
+
+async def batch_worker():
+    while True:
+        items = await _collect_batch()
+        _inflight[:] = items
+        batch = BATCH_BUF[:len(items)]
+        try:
+            for j, (key, _) in enumerate(items):
+                batch[j] = np.frombuffer(key, dtype=np.float64)
+            np.subtract(batch, MEAN, out=batch)
+            np.divide(batch, SCALE, out=batch)
+            x = BATCH_X[:len(items)]
+            # an in-range raw value can still overflow float32 once divided
+            # by a tiny scale_; such rows are rejected instead of predicted
+            with np.errstate(over="ignore"):
+                np.copyto(x, batch, casting="same_kind")
+            finite = np.isfinite(x).all(axis=1)
+            if not finite.all():
+                x[~finite] = 0.0
+            preds = predict_batch(x)
+        except Exception as e:
+            for _, fut in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            _inflight.clear()
+            continue
+        # one tolist() per batch yields native Python floats, instead of a
+        # numpy scalar per row that then needs float()
+        for pred, ok, (_, fut) in zip(preds.tolist(), finite.tolist(), items):
+            # the client may have disconnected and cancelled its future
+            if fut.done():
+                continue
+            if ok:
+                fut.set_result(pred)
+            else:
+                fut.set_exception(NonFiniteInput("feature values overflow float32 after scaling"))
+        _inflight.clear()
+
+
+def _on_batch_worker_done(task: asyncio.Task):
+    """Log why the batch worker stopped and fail every request still queued."""
+    exc = None if task.cancelled() else task.exception()
+    if exc is not None:
+        print("Batch worker died:", repr(exc))
+    pending = [fut for _, fut in _inflight]
+    _inflight.clear()
+    while True:
+        try:
+            pending.append(QUEUE.get_nowait()[1])
+        except asyncio.QueueEmpty:
+            break
+    for fut in pending:
+        if not fut.done():
+            fut.set_exception(RuntimeError("batch worker is not running"))
+
+
+@app.on_event("startup")
+async def start_batch_worker():
+    global QUEUE, _batch_task
+    QUEUE = asyncio.Queue()
+    if booster is not None and MEAN is not None:
+        _batch_task = asyncio.create_task(batch_worker())
+        _batch_task.add_done_callback(_on_batch_worker_done)
+
+
+@app.on_event("shutdown")
+async def stop_batch_worker():
+    if _batch_task is not None:
+        _batch_task.cancel()
+
+# -------------------------
+# Row assembly
+# -------------------------
+# When the Cython extension has been built (see the Dockerfile), the payload
+# is mapped onto feature order by assemble() in _assemble.pyx; otherwise by
+# the Python assemble_row. Any other ROW_ASSEMBLY value falls back to Python.
+ROW_ASSEMBLIES = ("python", "cython")
+ROW_ASSEMBLY = os.environ.get("ROW_ASSEMBLY") or ("cython" if assemble_c is not None else "python")
+
+
+def assemble_row(user_dict: Dict[str, Optional[float]]) -> Tuple[List[float], List[str]]:
+    """Map a payload onto internal feature order; missing features are 0.0."""
+    row = [0.0] * N_FEATS
+    present = [False] * N_FEATS
+    lookup = NAME_TO_IDX.get
+    # one pass over the payload; an internal name beats an alias whatever
+    # order the keys arrive in
+    for k, v in user_dict.items():
+        hit = lookup(k)
+        if hit is None or v is None:
+            continue
+        i, is_alias = hit
+        if is_alias and present[i]:
+            continue
+        row[i] = v
+        present[i] = True
+    missing = [f for f, p in zip(internal_features, present) if not p]
+    return row, missing
+
+
+def check_assembler_parity() -> bool:
+    """
+    Run the Cython assembler on a few synthetic payloads and compare it with
+    assemble_row: internal names beat aliases in either key order, and
+    null counts as missing.
+    """
+    both = {}
+    for i, keys in enumerate(FEATURE_LOOKUP):
+        for j, k in enumerate(keys):
+            both[k] = i + j / 10
+    internal = set(internal_features)
+    cases = [
+        {},
+        both,
+        dict(reversed(list(both.items()))),
+        {k: None if k in internal else v for k, v in both.items()},
+        dict.fromkeys(both),
+    ]
+    for payload in cases:
+        expected_row, expected_missing = assemble_row(payload)
+        row = np.empty(N_FEATS, dtype=np.float64)
+        try:
+            missing = assemble_c(payload, FEATURE_LOOKUP, row)
+        except Exception as e:
+            print("Cython row assembly failed:", str(e))
+            return False
+        if missing != expected_missing or not np.array_equal(row, expected_row):
+            return False
+    return True
+
+# -------------------------
+# Prediction cache
+# -------------------------
+# Dashboards often resend identical sensor snapshots, so predictions are kept
+# in an LRU keyed by the exact bytes of the assembled float64 row. The same
+# bytes carry the row through the batch queue, so the backend sees exactly
+# the row scaler.transform would produce and a hit returns what the miss
+# predicted. Only the xgboost backend then matches model.predict bit for bit;
+# treelite, ONNX and FIL sum the trees in a different float32 order and can
+# differ by ~1e-4. Only touched from the event loop thread.
+CACHE_SIZE = 4096
+_pred_cache: "OrderedDict[bytes, float]" = OrderedDict()
+
+# Per-thread scratch row for building cache keys, so a request only allocates
+# the key bytes.
+_TLS = threading.local()
+
+
+def scratch_row() -> np.ndarray:
+    buf = getattr(_TLS, "buf", None)
+    if buf is None:
+        buf = _TLS.buf = np.empty(N_FEATS, dtype=np.float64)
+    return buf
+
+
+def row_key(row) -> bytes:
+    buf = scratch_row()
+    # the Cython assembler already writes straight into the scratch row
+    if row is not buf:
+        buf[:] = row
+    return buf.tobytes()
+
+
+def cache_get(key: bytes) -> Optional[float]:
+    pred = _pred_cache.get(key)
+    if pred is not None:
+        _pred_cache.move_to_end(key)
+    return pred
+
+
+def cache_put(key: bytes, pred: float):
+    _pred_cache[key] = pred
+    if len(_pred_cache) > CACHE_SIZE:
+        _pred_cache.popitem(last=False)
 
 # -------------------------
 # Request model
 # -------------------------
+# Typed so pydantic-core coerces values to float and rejects non-numeric,
+# non-finite or out-of-float32-range input (422) before the handler runs.
+# The model sees float32, so anything beyond F32_MAX would overflow to inf.
+# null is still treated as missing.
+F32_MAX = float(np.finfo(np.float32).max)
+FeatureValue = Annotated[float, Field(allow_inf_nan=False, ge=-F32_MAX, le=F32_MAX)]
+
+
 class InputData(BaseModel):
-    data: dict
+    data: Dict[str, Optional[FeatureValue]] = Field(..., max_length=256)
+
+
+# missing_filled_with_zero is omitted from the response when it is empty
+class PredictOut(BaseModel):
+    Predicted_RUL: float
+    missing_filled_with_zero: List[str] = []
+
+
+async def parse_payload(request: Request) -> InputData:
+    """
+    Parse the request body with orjson, then validate it as InputData.
+    Errors use the same 422 shapes FastAPI produces for a regular body
+    parameter (missing / json_invalid / validation errors under "body").
+    """
+    raw = await request.body()
+    try:
+        body = orjson.loads(raw) if raw else None
+    except orjson.JSONDecodeError as e:
+        raise RequestValidationError([{
+            "type": "json_invalid",
+            "loc": ("body", e.pos),
+            "msg": "JSON decode error",
+            "input": {},
+            "ctx": {"error": e.msg},
+        }])
+    if body is None:
+        raise RequestValidationError([{
+            "type": "missing", "loc": ("body",), "msg": "Field required", "input": None,
+        }])
+    try:
+        return InputData.model_validate(body)
+    except ValidationError as e:
+        errors = e.errors(include_url=False)
+        for err in errors:
+            err["loc"] = ("body", *err["loc"])
+        raise RequestValidationError(errors)
+
+
+# The body is read by parse_payload rather than a typed parameter, so the
+# request schema is declared explicitly to keep it in /openapi.json and /docs.
+PREDICT_OPENAPI_EXTRA = {
+    "requestBody": {
+        "content": {"application/json": {"schema": InputData.model_json_schema()}},
+        "required": True,
+    }
+}
 
 # -------------------------
 # Endpoints
@@ -134,12 +699,14 @@ def root():
 
 @app.get("/health")
 def health():
-    ok = model is not None and scaler is not None and len(internal_features) > 0
+    ok = model is not None and MEAN is not None and len(internal_features) > 0
     return {
         "status": "ok" if ok else "error",
         "model_path": MODEL_PATH,
         "scaler_path": SCALER_PATH,
         "features_count": len(internal_features),
+        "backend": BACKEND,
+        "gpu_fil": fil is not None,
     }
 
 @app.get("/info")
@@ -149,7 +716,7 @@ def info():
     for feat in internal_features:
         features_info.append({
             "internal_name": feat,
-            "readable_aliases": internal_to_readables.get(feat, [])
+            "readable_aliases": internal_to_readables.get(feat, ())
         })
     return {
         "model_loaded": model is not None,
@@ -157,47 +724,52 @@ def info():
         "note": "You can supply either internal_name or one of readable_aliases in /predict payload."
     }
 
-@app.post("/predict")
-def predict(payload: InputData):
-    if model is None or scaler is None or not internal_features:
+@app.post(
+    "/predict",
+    response_model=PredictOut,
+    response_model_exclude_defaults=True,
+    openapi_extra=PREDICT_OPENAPI_EXTRA,
+)
+async def predict(payload: InputData = Depends(parse_payload)):
+    if model is None or MEAN is None or not internal_features:
         # Return 500 with clear message so Railway logs show the reason
         raise HTTPException(status_code=500, detail="Model or scaler not loaded on server. Check logs.")
 
-    user_dict = payload.data
-    if not isinstance(user_dict, dict):
-        raise HTTPException(status_code=400, detail="`data` must be an object/dict of feature:value pairs")
+    if ROW_ASSEMBLY == "cython":
+        row = scratch_row()
+        missing = assemble_c(payload.data, FEATURE_LOOKUP, row)
+    else:
+        row, missing = assemble_row(payload.data)
 
-    row = []
-    missing = []
-    for feat in internal_features:
-        val: Optional[float] = None
-        # 1) direct internal key
-        if feat in user_dict:
-            val = user_dict.get(feat)
-        else:
-            # 2) check readable aliases
-            aliases = internal_to_readables.get(feat, [])
-            for a in aliases:
-                if a in user_dict:
-                    val = user_dict.get(a)
-                    break
-        if val is None:
-            missing.append(feat)
-            val = 0.0
+    key = row_key(row)
+    pred = cache_get(key)
+    if pred is None:
+        if _batch_task is None or _batch_task.done():
+            raise HTTPException(status_code=500, detail="Model prediction failed: batch worker is not running")
+        fut = asyncio.get_running_loop().create_future()
+        QUEUE.put_nowait((key, fut))
         try:
-            row.append(float(val))
-        except Exception:
-            raise HTTPException(status_code=400, detail=f"Feature '{feat}' has non-numeric value: {val}")
+            pred = await asyncio.wait_for(fut, PREDICT_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=500, detail="Model prediction timed out")
+        except NonFiniteInput as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Model prediction failed: {str(e)}")
+        cache_put(key, pred)
 
-    x = np.array(row).reshape(1, -1)
-    try:
-        x_scaled = scaler.transform(x)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Scaler transform failed: {str(e)}")
+    return {"Predicted_RUL": pred, "missing_filled_with_zero": missing}
 
-    try:
-        pred = model.predict(x_scaled)[0]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Model prediction failed: {str(e)}")
 
-    return {"Predicted_RUL": float(pred), "missing_filled_with_zero": missing}
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", "8080")),
+        loop="uvloop",
+        http="httptools",
+        workers=os.cpu_count() or 1,
+        access_log=False,
+    )
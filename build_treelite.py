@@ -0,0 +1,27 @@
+# build_treelite.py
+"""
+Ahead-of-time build of the treelite library for the XGBoost model.
+
+    python build_treelite.py
+
+Writes xgboost_model_<hash>.so next to xgboost_model.pkl. The Dockerfile runs
+this in its build stage, which has gcc; the runtime image has no compiler, so
+app.py can only reuse a library built here.
+"""
+import sys
+
+import joblib
+
+from app import compile_treelite, find_artifact_paths
+
+
+def main():
+    model_path, _, _ = find_artifact_paths()
+    model = joblib.load(model_path)
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    if compile_treelite(booster, model_path) is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
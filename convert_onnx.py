@@ -0,0 +1,44 @@
+# convert_onnx.py
+"""
+One-off export of the XGBoost model to ONNX for the ONNX Runtime backend.
+
+    pip install onnxmltools onnxruntime
+    python convert_onnx.py
+
+Writes xgboost_model.onnx next to xgboost_model.pkl. app.py picks it up at
+startup when onnxruntime is installed.
+"""
+import os
+
+import joblib
+from onnxmltools import convert_xgboost
+from onnxmltools.convert.common.data_types import FloatTensorType
+
+from app import find_artifact_paths, ONNX_INPUT_NAME
+
+
+def main():
+    model_path, _, features_path = find_artifact_paths()
+    with open(features_path, "r") as f:
+        n_features = len([line for line in f if line.strip()])
+
+    model = joblib.load(model_path)
+    # convert the raw Booster: the pickled sklearn wrapper may come from an
+    # older xgboost and lack attributes the converter expects
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    onx = convert_xgboost(
+        booster,
+        initial_types=[(ONNX_INPUT_NAME, FloatTensorType([None, n_features]))],
+    )
+
+    # Note: onnxruntime.quantization.quantize_dynamic only rewrites ai.onnx
+    # ops such as MatMul/Gemm; a tree ensemble (ai.onnx.ml) has nothing to
+    # quantize, so the model is exported as fp32.
+    out_path = os.path.join(os.path.dirname(model_path), "xgboost_model.onnx")
+    with open(out_path, "wb") as f:
+        f.write(onx.SerializeToString())
+    print("Wrote", out_path)
+
+
+if __name__ == "__main__":
+    main()
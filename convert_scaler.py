@@ -0,0 +1,34 @@
+# convert_scaler.py
+"""
+One-off export of the StandardScaler's mean_/scale_ to scaler.npz.
+
+    python convert_scaler.py
+
+app.py loads scaler.npz when it sits next to scaler.pkl, which avoids
+unpickling the sklearn object on every worker start. The arrays are kept in
+float64, and the npz records the sha256 of scaler.pkl so app.py can ignore
+it once the pickle is replaced.
+"""
+import os
+
+import joblib
+import numpy as np
+
+from app import file_sha256, find_artifact_paths
+
+
+def main():
+    _, scaler_path, _ = find_artifact_paths()
+    scaler = joblib.load(scaler_path)
+    out_path = os.path.join(os.path.dirname(scaler_path), "scaler.npz")
+    np.savez(
+        out_path,
+        mean=scaler.mean_.astype(np.float64),
+        scale=scaler.scale_.astype(np.float64),
+        source_sha256=np.array(file_sha256(scaler_path)),
+    )
+    print("Wrote", out_path)
+
+
+if __name__ == "__main__":
+    main()
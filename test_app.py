@@ -0,0 +1,132 @@
+# test_app.py
+"""
+Tests for the /predict request path.
+
+    pip install pytest httpx
+    python -m pytest -q
+
+TestClient is used as a context manager so the startup hooks load the
+artifacts and start the batch worker.
+"""
+import joblib
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+
+@pytest.fixture
+def client():
+    with TestClient(app.app) as c:
+        app._pred_cache.clear()
+        yield c
+
+
+@pytest.fixture(params=["python", "cython"])
+def assembler(request, client, monkeypatch):
+    if request.param == "cython" and app.assemble_c is None:
+        pytest.skip("_assemble extension not built")
+    monkeypatch.setattr(app, "ROW_ASSEMBLY", request.param)
+    return request.param
+
+
+def predict(client, data):
+    r = client.post("/predict", json={"data": data})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def aliased_feature():
+    for feat in app.internal_features:
+        aliases = app.internal_to_readables.get(feat)
+        if aliases:
+            return feat, aliases[0]
+    pytest.skip("no feature has a readable alias")
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+def test_predict_matches_model(client, assembler):
+    model = joblib.load(app.MODEL_PATH)
+    scaler = joblib.load(app.SCALER_PATH)
+    rng = np.random.default_rng(0)
+    X = rng.normal(scaler.mean_, scaler.scale_, size=(20, len(scaler.mean_)))
+    expected = model.predict(scaler.transform(X))
+
+    got = [
+        predict(client, dict(zip(app.internal_features, map(float, row))))["Predicted_RUL"]
+        for row in X
+    ]
+    # only the xgboost backend is bit-exact; treelite/ONNX/FIL sum trees in
+    # a different float32 order
+    atol = 0 if app.BACKEND == "xgboost" else 1e-3
+    np.testing.assert_allclose(got, expected, rtol=0, atol=atol)
+
+
+def test_internal_name_beats_alias(client, assembler):
+    feat, alias = aliased_feature()
+    internal_only = predict(client, {feat: 1.0})
+    assert predict(client, {feat: 1.0, alias: 5.0}) == internal_only
+    assert predict(client, {alias: 5.0, feat: 1.0}) == internal_only
+    assert predict(client, {alias: 1.0}) == internal_only
+
+
+def test_null_counts_as_missing(client, assembler):
+    feat, alias = aliased_feature()
+    assert predict(client, {feat: None, alias: 1.0}) == predict(client, {feat: 1.0})
+
+    out = predict(client, {feat: None})
+    assert feat in out["missing_filled_with_zero"]
+    assert out == predict(client, {})
+
+
+@pytest.mark.parametrize(
+    "body, err_type",
+    [
+        (b'{"data": {"s1": ', "json_invalid"),
+        (b"", "missing"),
+        (b"null", "missing"),
+        (b'{"data": {"s1": "abc"}}', "float_parsing"),
+        (b'{"data": {"s1": "inf"}}', "finite_number"),
+        (b'{"data": {"s1": Infinity}}', "json_invalid"),
+        (b'{"data": {"s1": 1e39}}', "less_than_equal"),
+        (b'{"data": {"s1": -1e39}}', "greater_than_equal"),
+    ],
+)
+def test_invalid_body_is_422(client, body, err_type):
+    r = client.post("/predict", content=body, headers={"Content-Type": "application/json"})
+    assert r.status_code == 422
+    err = r.json()["detail"][0]
+    assert err["type"] == err_type
+    assert err["loc"][0] == "body"
+
+
+def test_overflow_after_scaling_is_422(client):
+    i = int(np.argmin(app.SCALE))
+    r = client.post("/predict", json={"data": {app.internal_features[i]: 3.4e38}})
+    assert r.status_code == 422
+    assert not app._pred_cache
+
+
+def test_cache_hit_skips_model(client, monkeypatch):
+    data = {app.internal_features[0]: 1.5}
+    first = predict(client, data)
+    assert len(app._pred_cache) == 1
+
+    def fail(x):
+        raise AssertionError("cache miss")
+
+    monkeypatch.setattr(app, "predict_batch", fail)
+    assert predict(client, data) == first
+
+
+def test_dead_batch_worker_returns_500(client, monkeypatch):
+    # breaks batch_worker outside its per-batch try block, killing the task
+    monkeypatch.setattr(app, "BATCH_BUF", None)
+    r = client.post("/predict", json={"data": {"s1": 1.0}})
+    assert r.status_code == 500
+    assert app._batch_task.done()
+
+    r = client.post("/predict", json={"data": {"s1": 2.0}})
+    assert r.status_code == 500
+    assert r.json()["detail"] == "Model prediction failed: batch worker is not running"